@@ -0,0 +1,178 @@
+# Columnar table of PubTator span annotations for corpus-level analysis.
+
+import os
+import json
+
+from array import array
+from logging import warning, error
+
+from pubtator import SpanAnnotation
+
+
+COLUMNS = ('docid', 'start', 'end', 'type', 'norm')
+
+# Columns holding codes into string pools
+POOLED = ('type', 'norm')
+
+POOL_FILE = 'pools.json'
+
+# Norm code for annotations without normalization
+NO_NORM = -1
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        error('failed to import numpy; try `pip3 install numpy`')
+        raise
+    return numpy
+
+
+class AnnotationTable(object):
+    """Span annotations stored as NumPy columns docid, start, end, type
+    and norm, where type and norm are codes into string pools.
+
+    Spans with several normalizations have one row per normalization,
+    as in SpanAnnotation.to_dicts(); spans without one have norm code
+    NO_NORM.
+    """
+
+    def __init__(self, columns, pools):
+        self.columns = columns
+        self.pools = pools
+        self._codes = {
+            c: { v: i for i, v in enumerate(pools[c]) } for c in POOLED
+        }
+
+    def __len__(self):
+        return len(self.columns['docid'])
+
+    def code(self, column, value):
+        """Return code of value in pool for column, None if not found."""
+        if column == 'norm' and value is None:
+            return NO_NORM
+        return self._codes[column].get(value)
+
+    def decode(self, column, code):
+        if column == 'norm' and code == NO_NORM:
+            return None
+        return self.pools[column][code]
+
+    def mask(self, **conditions):
+        """Return boolean mask of rows where each given column has the
+        given value or one of the given values (list, tuple or set)."""
+        np = import_numpy()
+        mask = np.ones(len(self), dtype=bool)
+        for column, values in conditions.items():
+            if column not in COLUMNS:
+                raise ValueError('unknown column {}'.format(column))
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            if column in POOLED:
+                values = [self.code(column, v) for v in values]
+                values = [v for v in values if v is not None]
+            elif column == 'docid':
+                values = [int(v) for v in values]
+            mask &= np.isin(self.columns[column], values)
+        return mask
+
+    def select(self, mask=None, **conditions):
+        """Return table with rows matching mask and/or conditions (see
+        mask()). The string pools are shared."""
+        if mask is None:
+            mask = self.mask(**conditions)
+        elif conditions:
+            mask = mask & self.mask(**conditions)
+        columns = { c: self.columns[c][mask] for c in COLUMNS }
+        return AnnotationTable(columns, self.pools)
+
+    def count_by(self, column, distinct=None):
+        """Return dict mapping values of column to row counts, or to the
+        number of distinct values of column distinct if given."""
+        np = import_numpy()
+        keys = self.columns[column]
+        if distinct is not None:
+            pairs = np.unique(
+                np.stack([keys, self.columns[distinct]], axis=1), axis=0)
+            keys = pairs[:, 0]
+        values, counts = np.unique(keys, return_counts=True)
+        if column in POOLED:
+            values = [self.decode(column, v) for v in values.tolist()]
+        else:
+            values = values.tolist()
+        return dict(zip(values, counts.tolist()))
+
+    def save(self, directory):
+        """Save table as NumPy column files and JSON string pools."""
+        np = import_numpy()
+        os.makedirs(directory, exist_ok=True)
+        for c in COLUMNS:
+            np.save(os.path.join(directory, c + '.npy'), self.columns[c])
+        with open(os.path.join(directory, POOL_FILE), 'w') as f:
+            json.dump(self.pools, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load table saved with save(), memory-mapping columns if mmap."""
+        np = import_numpy()
+        mode = 'r' if mmap else None
+        columns = {
+            c: np.load(os.path.join(directory, c + '.npy'), mmap_mode=mode)
+            for c in COLUMNS
+        }
+        with open(os.path.join(directory, POOL_FILE)) as f:
+            pools = json.load(f)
+        return cls(columns, pools)
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Return table of span annotations in PubTatorDocuments, such as
+        those returned by read_pubtator()."""
+        np = import_numpy()
+        docids, starts, ends = array('q'), array('q'), array('q')
+        types, norms = array('l'), array('l')
+        pools = { c: [] for c in POOLED }
+        codes = { c: {} for c in POOLED }
+
+        def encode(column, value):
+            try:
+                return codes[column][value]
+            except KeyError:
+                codes[column][value] = len(pools[column])
+                pools[column].append(value)
+                return codes[column][value]
+
+        for document in documents:
+            try:
+                docid = int(document.id)
+            except ValueError:
+                warning('skipping non-numeric document ID {}'.format(
+                    document.id))
+                continue
+            for a in document.annotations:
+                if not isinstance(a, SpanAnnotation):
+                    continue
+                try:
+                    a_norms = a.norms
+                except ValueError as e:
+                    warning('skipping annotation in {}: {}'.format(
+                        document.id, e))
+                    continue
+                type_code = encode('type', a.type)
+                for norm in a_norms:
+                    docids.append(docid)
+                    starts.append(a.start)
+                    ends.append(a.end)
+                    types.append(type_code)
+                    norms.append(NO_NORM if norm is None else
+                                 encode('norm', norm))
+
+        columns = {
+            'docid': np.array(docids, dtype=np.int64),
+            'start': np.array(starts, dtype=np.int64),
+            'end': np.array(ends, dtype=np.int64),
+            'type': np.array(types, dtype=np.int32),
+            'norm': np.array(norms, dtype=np.int32),
+        }
+        return cls(columns, pools)
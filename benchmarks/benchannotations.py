@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Benchmark memory use and throughput of PubTator annotation objects.
+
+import os
+import sys
+import time
+import logging
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pubtator import read_pubtator, SpanAnnotation
+
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(__file__), '..', 'data',
+                             'samples', 'bioconcepts2pubtator_offsets.sample')
+
+
+def argparser():
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--repeats', metavar='INT', type=int, default=3,
+                    help='Number of repeats for timings (default 3)')
+    ap.add_argument('files', metavar='FILE', nargs='*',
+                    default=[DEFAULT_INPUT],
+                    help='Input PubTator files (default bundled sample)')
+    return ap
+
+
+def read_documents(files):
+    documents = []
+    for fn in files:
+        with open(fn, encoding='utf-8') as f:
+            documents.extend(read_pubtator(f, validate=False))
+    return documents
+
+
+def best_time(func, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def access_norms(spans):
+    for a in spans:
+        a.norms
+
+
+def serialize(documents):
+    for d in documents:
+        d.to_json()
+        d.to_wa_jsonld()
+        ann_by_id = {}
+        for a in d.annotations:
+            if isinstance(a, SpanAnnotation):
+                a.to_ann_lines(ann_by_id)
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+    logging.disable(logging.WARNING)
+
+    tracemalloc.start()
+    documents = read_documents(args.files)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    spans = [
+        a for d in documents for a in d.annotations
+        if isinstance(a, SpanAnnotation)
+    ]
+    read_time = best_time(lambda: read_documents(args.files), args.repeats)
+    norms_time = best_time(lambda: access_norms(spans), args.repeats)
+    serialize_time = best_time(lambda: serialize(documents), args.repeats)
+
+    print('documents\t{}'.format(len(documents)))
+    print('spans\t{}'.format(len(spans)))
+    print('memory (bytes/span)\t{:.1f}'.format(memory/len(spans)))
+    print('read (spans/sec)\t{:.0f}'.format(len(spans)/read_time))
+    print('norms (spans/sec)\t{:.0f}'.format(len(spans)/norms_time))
+    print('serialize (docs/sec)\t{:.0f}'.format(len(documents)/serialize_time))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
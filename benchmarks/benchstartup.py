@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+# Benchmark startup time of the command-line entry points.
+#
+# With --baseline REV, the entry points of git revision REV are timed
+# alongside, taking turns so that changes in machine load affect both
+# equally, and the exit status is 1 if the startup (-h) of any is slower
+# than the baseline by more than --tolerance. End-to-end runs are shown
+# for reference, as they include work added since the baseline.
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ENTRY_POINTS = [
+    'convertpubtator.py',
+    'listpubtatorids.py',
+    'filterpubtator.py',
+]
+
+# Minimal input for end-to-end runs
+DOCUMENT = '1|t|A title.\n1|a|An abstract, e.g. this one. It has two.\n\n'
+
+DEFAULT_TOLERANCE = 0.05
+
+
+def argparser():
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-b', '--baseline', metavar='REV', default=None,
+                    help='Compare to entry points of git revision REV, '
+                    'failing if slower')
+    ap.add_argument('-n', '--repeats', metavar='INT', type=int, default=5,
+                    help='Number of repeats for timings (default 5)')
+    ap.add_argument('-s', '--punkt-snapshot', metavar='FILE', default=None,
+                    help='Also time sentence splitting with snapshot FILE')
+    ap.add_argument('-t', '--tolerance', metavar='FRACTION', type=float,
+                    default=DEFAULT_TOLERANCE,
+                    help='Allowed slowdown relative to baseline '
+                    '(default {})'.format(DEFAULT_TOLERANCE))
+    return ap
+
+
+def run_time(command, cwd):
+    """Return time to run command in cwd, None if it fails."""
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    return elapsed if result.returncode == 0 else None
+
+
+def best_times(command, roots, repeats):
+    """Return best time of command in each of roots, running them in
+    turn, None for roots where it fails."""
+    best = [None] * len(roots)
+    failed = set()
+    for r in range(repeats):
+        # alternate the order so that neither root always runs first
+        order = list(range(len(roots)))
+        if r % 2:
+            order.reverse()
+        for i in order:
+            if i in failed:
+                continue
+            elapsed = run_time(command, roots[i])
+            if elapsed is None:
+                failed.add(i)
+                best[i] = None
+            elif best[i] is None or elapsed < best[i]:
+                best[i] = elapsed
+    return best
+
+
+def compile_tree(root):
+    """Write bytecode for modules in root, as an installed tree would
+    have it (e.g. with PYTHONDONTWRITEBYTECODE set)."""
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', '-l', root],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def extract_revision(rev, directory):
+    """Extract files of git revision rev into directory."""
+    archive = subprocess.run(['git', 'archive', rev], cwd=ROOT, check=True,
+                             stdout=subprocess.PIPE).stdout
+    subprocess.run(['tar', '-x', '-C', directory], input=archive,
+                   check=True)
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+    python = sys.executable
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        roots = [ROOT]
+        if args.baseline:
+            baseline_root = os.path.join(tmpdir, 'baseline')
+            os.mkdir(baseline_root)
+            extract_revision(args.baseline, baseline_root)
+            roots.append(baseline_root)
+        for root in roots:
+            compile_tree(root)
+
+        input_fn = os.path.join(tmpdir, 'input.pubtator')
+        ids_fn = os.path.join(tmpdir, 'ids.txt')
+        with open(input_fn, 'w') as f:
+            f.write(DOCUMENT)
+        with open(ids_fn, 'w') as f:
+            f.write('1\n')
+        out = os.path.join(tmpdir, 'out')
+        # (name, command, whether compared to baseline)
+        commands = [('python (no imports)', [python, '-c', 'pass'], False)]
+        for script in ENTRY_POINTS:
+            commands.append(('{} -h'.format(script), [python, script, '-h'],
+                             True))
+        for script, script_args in [
+                ('convertpubtator.py', ['-o', out, input_fn]),
+                ('listpubtatorids.py', [input_fn]),
+                ('filterpubtator.py', [ids_fn, input_fn])]:
+            commands.append((script, [python, script] + script_args, False))
+        if args.punkt_snapshot:
+            commands.append(('convertpubtator.py -ss', [
+                python, 'convertpubtator.py', '-ss', '--punkt-snapshot',
+                args.punkt_snapshot, '-o', out, input_fn], False))
+
+        slower = []
+        for name, command, compared in commands:
+            times = best_times(command, roots, args.repeats)
+            print('\t'.join([name] + [
+                'failed' if t is None else '{:.3f}'.format(t)
+                for t in times]))
+            if compared and len(times) > 1 and None not in times:
+                current, baseline = times
+                if current > baseline * (1 + args.tolerance):
+                    slower.append(name)
+
+    if slower:
+        print('slower than {}: {}'.format(args.baseline, ', '.join(slower)),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
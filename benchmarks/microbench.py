@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+# Microbenchmarks for parsing, serialization, sentence splitting and
+# cooccurrence extraction, with results saved as JSON for comparison
+# across commits.
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, 'tools'))
+
+from pubtator import read_pubtator, SpanAnnotation, PARSERS
+
+
+DEFAULT_INPUT = os.path.join(ROOT, 'data', 'samples',
+                             'bioconcepts2pubtator_offsets.sample')
+
+# Entities per synthetic cooccurrence document and sentences they span
+SYNTHETIC_SIZES = [(20, 5), (100, 25), (500, 100)]
+
+# Characters and entities of synthetic full-text documents, with
+# sentences of FULLTEXT_SENTENCE_LENGTH characters
+FULLTEXT_SIZES = [(100000, 200), (1000000, 2000), (10000000, 20000)]
+
+FULLTEXT_SENTENCE_LENGTH = 150
+
+# Approximates sentence boundaries for cooccurrence inputs, avoiding a
+# dependency on the punkt model
+NAIVE_SENTENCE_RE = re.compile(r'\S[^.]*(?:\.|$)')
+
+
+def argparser():
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-c', '--compare', metavar='JSON', default=None,
+                    help='Compare results to earlier results in JSON')
+    ap.add_argument('-k', '--select', metavar='STR', default=None,
+                    help='Only run benchmarks with STR in name')
+    ap.add_argument('-l', '--list', default=False, action='store_true',
+                    help='List benchmarks and exit')
+    ap.add_argument('-n', '--repeats', metavar='INT', type=int, default=5,
+                    help='Number of repeats for timings (default 5)')
+    ap.add_argument('-o', '--output', metavar='JSON', default=None,
+                    help='Save results to JSON')
+    ap.add_argument('-r', '--results', metavar='JSON', default=None,
+                    help='Load results from JSON instead of running '
+                    '(with -c)')
+    ap.add_argument('-s', '--punkt-snapshot', metavar='FILE', default=None,
+                    help='Load punkt model from snapshot FILE')
+    ap.add_argument('file', metavar='FILE', nargs='?', default=DEFAULT_INPUT,
+                    help='Input PubTator file (default bundled sample)')
+    return ap
+
+
+def read_text(fn):
+    with open(fn, encoding='utf-8') as f:
+        return f.read()
+
+
+def read_documents(fn):
+    with open(fn, encoding='utf-8') as f:
+        return list(read_pubtator(f, validate=False))
+
+
+def span_annotations(documents):
+    return [
+        a for d in documents for a in d.annotations
+        if isinstance(a, SpanAnnotation)
+    ]
+
+
+def wa_annotations(document, sentences=True):
+    """Return webannotation objects for document, optionally with
+    sentence annotations from NAIVE_SENTENCE_RE."""
+    from webannotation import Annotation
+    data = json.loads(document.to_wa_jsonld())
+    if sentences:
+        target = data[0]['target'].split('#')[0] if data else document.id
+        for i, m in enumerate(NAIVE_SENTENCE_RE.finditer(document.text)):
+            data.append({
+                'id': 'sentence/{}'.format(i),
+                'type': 'Span',
+                'target': '{}#char={},{}'.format(target, m.start(), m.end()),
+                'body': {'type': 'sentence'},
+                'text': m.group(),
+            })
+    return [Annotation.from_dict(d) for d in data]
+
+
+def synthetic_annotations(entities, sentences, seed=0, sentence_length=100):
+    """Return webannotation objects for a synthetic document with
+    entities spread evenly over sentences of sentence_length characters,
+    with IDs drawn from a vocabulary of entities/2 items."""
+    from webannotation import SpanAnnotation as WASpan
+    rng = random.Random(seed)
+    target = 'PMID:0/text'
+    length = sentence_length
+    annotations = []
+    for i in range(sentences):
+        annotations.append(WASpan(
+            'PMID:0/sentence/{}'.format(i), 'Span',
+            '{}#char={},{}'.format(target, i*length, (i+1)*length-1),
+            {'type': 'sentence'}, 'x'*(length-1)))
+    for i in range(entities):
+        start = rng.randrange(sentences) * length + rng.randrange(length-10)
+        annotations.append(WASpan(
+            'PMID:0/ann/{}'.format(i), 'Span',
+            '{}#char={},{}'.format(target, start, start+5),
+            {'type': 'Chemical', 'id': 'MESH:{}'.format(
+                rng.randrange(max(1, entities//2)))}, 'x'*5))
+    return annotations
+
+
+class Benchmark(object):
+    """Timed function over a number of items of the given unit."""
+
+    def __init__(self, name, func, items, unit):
+        self.name = name
+        self.func = func
+        self.items = items
+        self.unit = unit
+
+    def run(self, repeats):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            self.func()
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        return {
+            'seconds': best,
+            'mean_seconds': sum(times)/len(times),
+            'items': self.items,
+            'unit': self.unit,
+            'per_second': self.items/best if best > 0 else None,
+        }
+
+
+def parser_benchmarks(fn):
+    text = read_text(fn)
+    documents = read_documents(fn)
+
+    def parse(parser):
+        def func():
+            for d in read_pubtator(io.StringIO(text), parser=parser):
+                pass
+        return func
+
+    def parse_lazy():
+        for d in read_pubtator(io.StringIO(text), lazy=True):
+            pass
+
+    for parser in sorted(PARSERS):
+        yield Benchmark('read_pubtator.{}'.format(parser), parse(parser),
+                        len(documents), 'documents')
+    yield Benchmark('read_pubtator.lazy', parse_lazy, len(documents),
+                    'documents')
+
+
+def norms_benchmarks(fn):
+    spans = span_annotations(read_documents(fn))
+
+    def parse_norms():
+        for a in spans:
+            a.parse_norms()
+
+    def norms():
+        for a in spans:
+            a.norms
+
+    yield Benchmark('SpanAnnotation.parse_norms', parse_norms, len(spans),
+                    'spans')
+    yield Benchmark('SpanAnnotation.norms', norms, len(spans), 'spans')
+
+
+def writer_benchmarks(fn):
+    from pubtatorconversion import BufferWriter
+    from pubtatorconversion import write_standoff, write_json
+    from pubtatorconversion import write_oa_jsonld, write_wa_jsonld
+
+    documents = read_documents(fn)
+
+    def write(write_func):
+        def func():
+            writer = BufferWriter()
+            for d in documents:
+                write_func(writer, d)
+        return func
+
+    for write_func in (write_standoff, write_json, write_oa_jsonld,
+                       write_wa_jsonld):
+        yield Benchmark(write_func.__name__, write(write_func),
+                        len(documents), 'documents')
+
+
+def ssplit_benchmarks(fn):
+    import ssplit
+    texts = [d.text for d in read_documents(fn)]
+    size = sum(len(t) for t in texts)
+
+    def split():
+        for t in texts:
+            ssplit.sentence_split(t)
+
+    def spans():
+        for t in texts:
+            ssplit.sentence_spans(t)
+
+    yield Benchmark('ssplit.sentence_split', split, size, 'characters')
+    yield Benchmark('ssplit.sentence_spans', spans, size, 'characters')
+
+
+def cooc_benchmarks(fn):
+    from addcoocrelations import cooccurrences, sentence_cooccurrences
+
+    documents = [
+        wa_annotations(d) for d in read_documents(fn) if d.annotations
+    ]
+
+    def sample(func):
+        def run():
+            for annotations in documents:
+                func(annotations)
+        return run
+
+    yield Benchmark('cooccurrences.sample', sample(cooccurrences),
+                    len(documents), 'documents')
+    yield Benchmark('sentence_cooccurrences.sample',
+                    sample(sentence_cooccurrences), len(documents),
+                    'documents')
+    for entities, sentences in SYNTHETIC_SIZES:
+        annotations = synthetic_annotations(entities, sentences)
+        name = 'sentence_cooccurrences.synthetic-{}'.format(entities)
+        yield Benchmark(name, lambda a=annotations: sentence_cooccurrences(a),
+                        entities, 'entities')
+    for characters, entities in FULLTEXT_SIZES:
+        annotations = synthetic_annotations(
+            entities, characters // FULLTEXT_SENTENCE_LENGTH,
+            sentence_length=FULLTEXT_SENTENCE_LENGTH)
+        name = 'sentence_cooccurrences.fulltext-{}k'.format(characters//1000)
+        yield Benchmark(name, lambda a=annotations: sentence_cooccurrences(a),
+                        characters, 'characters')
+
+
+BENCHMARK_GROUPS = [
+    ('parser', parser_benchmarks),
+    ('norms', norms_benchmarks),
+    ('writer', writer_benchmarks),
+    ('ssplit', ssplit_benchmarks),
+    ('cooc', cooc_benchmarks),
+]
+
+
+def benchmarks(fn):
+    """Yield Benchmarks, logging and skipping groups that fail to set up
+    (e.g. for lack of the punkt model)."""
+    for group, factory in BENCHMARK_GROUPS:
+        try:
+            for benchmark in factory(fn):
+                yield benchmark
+        except Exception as e:
+            print('skipping {} benchmarks: {}'.format(
+                group, error_summary(e)), file=sys.stderr)
+
+
+def error_summary(e):
+    """Return first line of exception message, e.g. for nltk banners."""
+    lines = [l.strip() for l in str(e).splitlines() if l.strip(' *')]
+    return '{}: {}'.format(type(e).__name__, lines[0] if lines else '')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(args):
+    results = {}
+    for benchmark in benchmarks(args.file):
+        if args.select and args.select not in benchmark.name:
+            continue
+        try:
+            results[benchmark.name] = benchmark.run(args.repeats)
+        except Exception as e:
+            # e.g. punkt model not found on first use
+            print('skipping {}: {}'.format(
+                benchmark.name, error_summary(e)), file=sys.stderr)
+            continue
+        print_result(benchmark.name, results[benchmark.name])
+    return {
+        'metadata': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'input': os.path.basename(args.file),
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+
+
+def print_result(name, result):
+    print('{}\t{:.4f}s\t{:.0f} {}/sec'.format(
+        name, result['seconds'], result['per_second'] or 0,
+        result['unit']))
+
+
+def compare(base, current):
+    """Print speedups of current over base results."""
+    print('benchmark\tbase/sec\tcurrent/sec\tspeedup')
+    for name, result in current['results'].items():
+        if name not in base['results']:
+            continue
+        old, new = base['results'][name], result
+        if old['items'] != new['items']:
+            print('{}\tdifferent inputs'.format(name))
+            continue
+        print('{}\t{:.0f}\t{:.0f}\t{:.2f}x'.format(
+            name, old['per_second'], new['per_second'],
+            old['seconds']/new['seconds']))
+
+
+def load_results(fn):
+    with open(fn) as f:
+        return json.load(f)
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+    logging.disable(logging.WARNING)
+    if args.list:
+        for benchmark in benchmarks(args.file):
+            print(benchmark.name)
+        return 0
+    if args.punkt_snapshot:
+        from ssplit import set_snapshot
+        set_snapshot(args.punkt_snapshot)
+
+    if args.results:
+        results = load_results(args.results)
+    else:
+        results = run_benchmarks(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, sort_keys=True, indent=2)
+            f.write('\n')
+    if args.compare:
+        compare(load_results(args.compare), results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,213 @@
+# Support for block-compressed gzip files with random access.
+#
+# A block-compressed file is a concatenation of independent gzip
+# members, each holding whole documents, so it remains readable with
+# gzip.open() and any gzip tool. A separate block index records the
+# compressed and uncompressed offsets of each member so that reading
+# can start from any block.
+
+import os
+import sys
+import zlib
+import struct
+
+from array import array
+from bisect import bisect_right
+
+
+BLOCK_INDEX_SUFFIX = '.blocks'
+
+BLOCK_INDEX_MAGIC = b'PTBLOCK1'
+
+# Header: magic, size of compressed file in bytes, number of blocks.
+HEADER = struct.Struct('<8sqq')
+
+# Default maximum uncompressed size of a block (may be exceeded by
+# single documents larger than this).
+DEFAULT_BLOCK_SIZE = 1024*1024
+
+DEFAULT_LEVEL = 6
+
+
+class BlockIndexError(Exception):
+    pass
+
+
+def block_index_filename(fn):
+    return fn + BLOCK_INDEX_SUFFIX
+
+
+def compress_block(data, level=DEFAULT_LEVEL):
+    """Return data compressed as a standalone gzip member."""
+    # wbits 16+MAX_WBITS gives gzip header with zero mtime, keeping
+    # output deterministic
+    c = zlib.compressobj(level, zlib.DEFLATED, 16+zlib.MAX_WBITS)
+    return c.compress(data) + c.flush()
+
+
+def decompress_block(data):
+    return zlib.decompress(data, 16+zlib.MAX_WBITS)
+
+
+class BlockGzipWriter(object):
+    """Write block-compressed gzip file and its block index.
+
+    Blocks only end when end_block() is called explicitly or when
+    write() is called with at_boundary=True after the current block has
+    reached block_size.
+    """
+
+    def __init__(self, fn, block_size=DEFAULT_BLOCK_SIZE,
+                 level=DEFAULT_LEVEL):
+        self.filename = fn
+        self.block_size = block_size
+        self.level = level
+        self._out = open(fn, 'wb')
+        self._buffer = []
+        self._buffered = 0
+        self._offsets = array('q', [0])    # compressed
+        self._uoffsets = array('q', [0])    # uncompressed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data, at_boundary=False):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if at_boundary and self._buffered >= self.block_size:
+            self.end_block()
+
+    def end_block(self):
+        if not self._buffered:
+            return
+        data = b''.join(self._buffer)
+        self._out.write(compress_block(data, self.level))
+        self._offsets.append(self._out.tell())
+        self._uoffsets.append(self._uoffsets[-1] + len(data))
+        self._buffer, self._buffered = [], 0
+
+    @property
+    def block_count(self):
+        return len(self._offsets)-1
+
+    @property
+    def offset(self):
+        """Uncompressed offset of next write."""
+        return self._uoffsets[-1] + self._buffered
+
+    def close(self):
+        if self._out is None:
+            return
+        self.end_block()
+        self._out.close()
+        self._out = None
+        write_block_index(block_index_filename(self.filename),
+                          self._offsets, self._uoffsets,
+                          os.path.getsize(self.filename))
+
+
+def write_block_index(fn, offsets, uoffsets, size):
+    """Write block index with compressed and uncompressed block start
+    offsets (each including the final end offset)."""
+    records = array('q')
+    for o, u in zip(offsets, uoffsets):
+        records.extend((o, u))
+    if sys.byteorder != 'little':
+        records.byteswap()
+    with open(fn, 'wb') as out:
+        out.write(HEADER.pack(BLOCK_INDEX_MAGIC, size, len(offsets)-1))
+        records.tofile(out)
+
+
+def read_block_index(fn):
+    """Return (size, offsets, uoffsets) from block index."""
+    with open(fn, 'rb') as f:
+        magic, size, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != BLOCK_INDEX_MAGIC:
+            raise BlockIndexError('not a block index: {}'.format(fn))
+        records = array('q')
+        records.fromfile(f, 2*(count+1))
+    if sys.byteorder != 'little':
+        records.byteswap()
+    return size, records[0::2], records[1::2]
+
+
+def has_block_index(fn):
+    """Return whether fn has an up-to-date block index."""
+    index_fn = block_index_filename(fn)
+    if not os.path.exists(index_fn):
+        return False
+    with open(index_fn, 'rb') as f:
+        magic, size, count = HEADER.unpack(f.read(HEADER.size))
+    return magic == BLOCK_INDEX_MAGIC and size == os.path.getsize(fn)
+
+
+class BlockGzipFile(object):
+    """Read-only binary file-like object giving random access to the
+    uncompressed data of a block-compressed gzip file."""
+
+    def __init__(self, fn):
+        self.name = fn
+        size, self.offsets, self.uoffsets = read_block_index(
+            block_index_filename(fn))
+        if size != os.path.getsize(fn):
+            raise BlockIndexError('out-of-date block index for {}'.format(fn))
+        self._file = open(fn, 'rb')
+        self._pos = 0
+        self._cached_block, self._cached_data = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return self.uoffsets[-1]
+
+    @property
+    def blocks(self):
+        """Return list of (start, end) uncompressed ranges of blocks."""
+        u = self.uoffsets
+        return [(u[i], u[i+1]) for i in range(len(u)-1)]
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self._pos = offset
+        elif whence == os.SEEK_CUR:
+            self._pos += offset
+        elif whence == os.SEEK_END:
+            self._pos = len(self) + offset
+        else:
+            raise ValueError('invalid whence {}'.format(whence))
+        return self._pos
+
+    def _block(self, i):
+        if i != self._cached_block:
+            self._file.seek(self.offsets[i])
+            data = self._file.read(self.offsets[i+1]-self.offsets[i])
+            self._cached_block = i
+            self._cached_data = decompress_block(data)
+        return self._cached_data
+
+    def read(self, size=-1):
+        parts, end = [], len(self)
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        while self._pos < end:
+            i = bisect_right(self.uoffsets, self._pos) - 1
+            start = self.uoffsets[i]
+            data = self._block(i)
+            part = data[self._pos-start:end-start]
+            parts.append(part)
+            self._pos += len(part)
+        return b''.join(parts)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+# Output documents from tar archive shards written by convertpubtator.py -a.
+
+import sys
+import logging
+
+from shardarchive import ShardArchive
+
+
+logging.basicConfig()
+logger = logging.getLogger('cat')
+info, warning, error = logger.info, logger.warning, logger.error
+
+
+def argparser():
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-l', '--list', default=False, action='store_true',
+                    help='List member paths only')
+    ap.add_argument('-v', '--verbose', default=False, action='store_true',
+                    help='Verbose output')
+    ap.add_argument('archive', metavar='DIR',
+                    help='Archive directory')
+    ap.add_argument('ids', metavar='ID', nargs='*',
+                    help='Document IDs to output (default all)')
+    return ap
+
+
+def output(path, data, options):
+    if options.list:
+        print(path)
+    else:
+        sys.stdout.write(data)
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    with ShardArchive(args.archive) as archive:
+        info('{} members in {} shards'.format(len(archive),
+                                              len(archive.shards)))
+        if not args.ids:
+            for path, data in archive:
+                output(path, data, args)
+        for id_ in args.ids:
+            members = archive.document(id_)
+            if not members:
+                warning('document {} not found'.format(id_))
+            for path in sorted(members):
+                output(path, members[path], args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,71 @@
+# Checkpoint manifests for resuming interrupted conversions.
+#
+# A checkpoint records the input files converted so far, the input file
+# and byte offset (a document boundary) up to which the current file
+# has been converted, and the state needed to continue from there
+# without duplicate or partial outputs, such as the commit point of
+# the writer. Manifests are JSON, replaced atomically on each save.
+
+import os
+import json
+import time
+
+
+CHECKPOINT_VERSION = 1
+
+DEFAULT_CHECKPOINT_INTERVAL = 60    # seconds
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class Checkpoint(object):
+    """Checkpoint manifest in file fn, saved at most every interval
+    seconds by maybe_save()."""
+
+    def __init__(self, fn, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.filename = fn
+        self.interval = interval
+        self.completed = []
+        self._last_save = time.monotonic()
+
+    def due(self):
+        return time.monotonic() - self._last_save >= self.interval
+
+    def save(self, state):
+        """Write state (dict) to the manifest, replacing it atomically."""
+        state = dict(state, version=CHECKPOINT_VERSION,
+                     completed=self.completed, time=time.time())
+        tmpfn = '{}.{}.tmp'.format(self.filename, os.getpid())
+        with open(tmpfn, 'w') as out:
+            json.dump(state, out, sort_keys=True, indent=2)
+            out.write('\n')
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmpfn, self.filename)
+        self._last_save = time.monotonic()
+
+    def maybe_save(self, state_func):
+        """Save state returned by state_func if interval has passed."""
+        if self.due():
+            self.save(state_func())
+            return True
+        return False
+
+    def complete(self, fn):
+        """Mark input file fn as fully converted."""
+        if fn not in self.completed:
+            self.completed.append(fn)
+
+    def load(self):
+        """Return saved state, None if there is no manifest."""
+        if not os.path.exists(self.filename):
+            return None
+        with open(self.filename) as f:
+            state = json.load(f)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise CheckpointError('unsupported checkpoint version in {}'.\
+                                  format(self.filename))
+        self.completed = list(state['completed'])
+        return state
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Recompress PubTator data into block-compressed gzip with indexes.
+
+import os
+import sys
+import gzip
+import logging
+
+from blockgzip import BlockGzipWriter, DEFAULT_BLOCK_SIZE, DEFAULT_LEVEL
+from blockgzip import block_index_filename
+from pubtatorindex import build_index, index_filename
+
+
+logging.basicConfig()
+logger = logging.getLogger('compress')
+info, warning, error = logger.info, logger.warning, logger.error
+
+
+def argparser():
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-b', '--block-size', metavar='BYTES', type=int,
+                    default=DEFAULT_BLOCK_SIZE,
+                    help='Uncompressed block size (default {})'.format(
+                        DEFAULT_BLOCK_SIZE))
+    ap.add_argument('-c', '--level', metavar='INT', type=int,
+                    default=DEFAULT_LEVEL,
+                    help='Compression level (default {})'.format(
+                        DEFAULT_LEVEL))
+    ap.add_argument('-I', '--no-index', default=False, action='store_true',
+                    help='Do not build document ID index')
+    ap.add_argument('-v', '--verbose', default=False, action='store_true',
+                    help='Verbose output')
+    ap.add_argument('input', metavar='FILE',
+                    help='Input PubTator file (plain or gzip)')
+    ap.add_argument('output', metavar='FILE.gz',
+                    help='Output block-compressed file')
+    return ap
+
+
+def compress(fn, outfn, options=None):
+    """Write PubTator file fn as block-compressed gzip outfn with blocks
+    ending on document boundaries, return number of blocks."""
+    opener = gzip.open if fn.endswith('.gz') else open
+    with opener(fn, 'rb') as f:
+        with BlockGzipWriter(outfn, options.block_size, options.level) as out:
+            for line in f:
+                out.write(line, at_boundary=line.isspace())
+    return out.block_count
+
+
+def main(argv):
+    args = argparser().parse_args(argv[1:])
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    if not args.output.endswith('.gz'):
+        error('output filename must end with .gz')
+        return 1
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        error('input and output must differ')
+        return 1
+    blocks = compress(args.input, args.output, args)
+    info('Wrote {} blocks to {}, index in {}'.format(
+        blocks, args.output, block_index_filename(args.output)))
+    if not args.no_index:
+        count = build_index(args.output)
+        info('Indexed {} documents in {}'.format(
+            count, index_filename(args.output)))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
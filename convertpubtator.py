@@ -2,27 +2,31 @@
 
 # Convert PubTator format to other formats.
 
-import os
 import sys
-import gzip
 import logging
 
-from contextlib import contextmanager
-from abc import ABC, abstractmethod
-from errno import EEXIST
-from random import random
-
-from pubtator import read_pubtator, SpanAnnotation
-from dictionary import SPECIES_NOMINALS
+from pubtator import read_pubtator, PARSERS, DEFAULT_PARSER
+from shardarchive import DEFAULT_SHARD_SIZE
+from sentencecache import DEFAULT_MAX_ENTRIES
+from serialization import set_style, get_style, STYLES
+from metrics import DEFAULT_PROMETHEUS_INTERVAL
+from checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from pubtatorconversion import logger, info, warn, DEFAULT_ENCODING
+from pubtatorconversion import FilesystemWriter, SQLiteWriter, ShardWriter
+from pubtatorconversion import MeteredWriter, segment, convert
+from pubtatorconversion import write_standoff, write_json
+from pubtatorconversion import write_oa_jsonld, write_wa_jsonld
+from pubtatorconversion import checkpoint_state, check_checkpoint_options
+from pubtatorconversion import restore_checkpoint, flush_hashes
+from pubtatorconversion import remove_unconverted
 
 
 logging.basicConfig()
-logger = logging.getLogger('convert')
-info, warn, error = logger.info, logger.warning, logger.error
 
 DEFAULT_OUT='converted'
 
-DEFAULT_ENCODING = 'utf-8'
+# Size of input ranges given to worker processes with --jobs
+CHUNK_SIZE = 4*1024*1024
 
 FORMATS = ['standoff', 'json', 'oa-jsonld', 'wa-jsonld']
 DEFAULT_FORMAT = 'standoff'
@@ -31,299 +35,112 @@ DEFAULT_FORMAT = 'standoff'
 def argparser():
     import argparse
     ap = argparse.ArgumentParser()
+    ap.add_argument('-a', '--archive', default=False, action='store_true',
+                    help='Output to tar archive shards (default filesystem)')
+    ap.add_argument('-c', '--checkpoint', metavar='FILE', default=None,
+                    help='Save checkpoints for --resume to FILE')
+    ap.add_argument('--checkpoint-interval', metavar='SECONDS', type=float,
+                    default=DEFAULT_CHECKPOINT_INTERVAL,
+                    help='Interval for --checkpoint (default {})'.format(
+                        DEFAULT_CHECKPOINT_INTERVAL))
+    ap.add_argument('--changes', metavar='FILE', default=None,
+                    help='Write added/changed/removed document IDs to FILE '
+                    'with --hashes')
+    ap.add_argument('--chunk-size', metavar='BYTES', type=int,
+                    default=CHUNK_SIZE,
+                    help='Input chunk size with -j (default {})'.format(
+                        CHUNK_SIZE))
     ap.add_argument('-D', '--database', default=False, action='store_true',
                     help='Output to SQLite DB (default filesystem)')
     ap.add_argument('-e', '--encoding', default=DEFAULT_ENCODING,
                     help='Encoding (default {})'.format(DEFAULT_ENCODING))
     ap.add_argument('-f', '--format', default=DEFAULT_FORMAT, choices=FORMATS,
                     help='Output format (default {})'.format(DEFAULT_FORMAT))
+    ap.add_argument('--json-style', default=get_style(), choices=STYLES,
+                    help='JSON output style (default {})'.format(get_style()))
+    ap.add_argument('-H', '--hashes', metavar='DB', default=None,
+                    help='Skip documents unchanged since previous '
+                    'conversion, keeping content hashes in DB')
     ap.add_argument('-i', '--ids', metavar='FILE', default=None,
                     help='Restrict to documents with IDs in file')
+    ap.add_argument('-j', '--jobs', metavar='N', default=1, type=int,
+                    help='Number of worker processes (default 1)')
     ap.add_argument('-l', '--limit', metavar='INT', type=int,
                     help='Maximum number of documents to output')
+    ap.add_argument('--metrics', metavar='FILE', default=None,
+                    help='Write JSON report of conversion metrics to FILE')
+    ap.add_argument('--no-id-cache', default=False, action='store_true',
+                    help='Do not cache ID list (see -i) in binary form')
     ap.add_argument('-n', '--no-text', default=False, action='store_true',
                     help='Do not output text files')
     ap.add_argument('-o', '--output', default=DEFAULT_OUT,
                     help='Output dir/db (default {})'.format(DEFAULT_OUT))
     ap.add_argument('-O', '--no-output', default=False, action='store_true',
                     help='Suppress output (debugging)')
+    ap.add_argument('-p', '--parser', default=DEFAULT_PARSER,
+                    choices=sorted(PARSERS),
+                    help='Parser engine (default {})'.format(DEFAULT_PARSER))
+    ap.add_argument('--prometheus', metavar='FILE', default=None,
+                    help='Write metrics periodically to Prometheus '
+                    'textfile FILE')
+    ap.add_argument('--prometheus-interval', metavar='SECONDS', type=float,
+                    default=DEFAULT_PROMETHEUS_INTERVAL,
+                    help='Interval for --prometheus (default {})'.format(
+                        DEFAULT_PROMETHEUS_INTERVAL))
+    ap.add_argument('--punkt-snapshot', metavar='FILE', default=None,
+                    help='Load punkt model for -ss from FILE, creating it '
+                    'if missing')
+    ap.add_argument('-R', '--resume', default=False, action='store_true',
+                    help='Resume from --checkpoint')
     ap.add_argument('-r', '--random', metavar='R', default=None, type=float,
-                    help='Sample random subset of documents')
+                    help='Sample random subset of documents with ratio R')
     ap.add_argument('-rn', '--retype-nominal', default=False,
                     action='store_true',
                     help='Retype nominal mentions')
     ap.add_argument('-s', '--subdirs', default=False, action='store_true',
                     help='Create subdirectories by document ID prefix.')
+    ap.add_argument('--seed', metavar='INT', default=0, type=int,
+                    help='Seed for sampling with --random (default 0)')
+    ap.add_argument('--shard-size', metavar='BYTES', type=int,
+                    default=DEFAULT_SHARD_SIZE,
+                    help='Maximum archive shard size with -a (default {})'.\
+                    format(DEFAULT_SHARD_SIZE))
     ap.add_argument('-ss', '--segment', default=False, action='store_true',
                     help='Add sentence segmentation annotations.')
+    ap.add_argument('-sc', '--sentence-cache', metavar='DB', default=None,
+                    help='Cache sentence segmentations in DB with -ss')
+    ap.add_argument('--sentence-cache-size', metavar='N', type=int,
+                    default=DEFAULT_MAX_ENTRIES,
+                    help='Maximum number of cached segmentations '
+                    '(default {})'.format(DEFAULT_MAX_ENTRIES))
+    ap.add_argument('-t', '--io-threads', metavar='N', default=0, type=int,
+                    help='Number of output threads (default 0, write in '
+                    'main thread)')
     ap.add_argument('-v', '--verbose', default=False, action='store_true',
                     help='Verbose output')
+    ap.add_argument('-z', '--compress', default=False, action='store_true',
+                    help='Block-gzip compress archive shards with -a')
     ap.add_argument('files', metavar='FILE', nargs='+',
                     help='Input PubTator files')
     return ap
 
 
-def encoding(options):
-    try:
-        return options.encoding
-    except:
-        return DEFAULT_ENCODING
-
-
-def mkdir_p(path):
-    """Create directory path if it doesn't already exist."""
-    # From http://stackoverflow.com/a/5032238
-    try:
-        os.makedirs(path)
-    except OSError as e:
-        if e.errno != EEXIST:
-            raise
-
-
-def output_filename(document, suffix, options):
-    if options is not None and options.subdirs:
-        outdir = document.id[:4]
-    else:
-        outdir = ''
-    return os.path.join(outdir, document.id + suffix)
-
-
-class WriterBase(ABC):
-    """Abstracts over filesystem and DB for output."""
-    @abstractmethod
-    def open(path):
-        pass
-
-
-class FilesystemWriter(WriterBase):
-    def __init__(self, base_dir=None):
-        self.base_dir = base_dir
-        self.known_directories = set()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *args):
-        pass
-
-    @contextmanager
-    def open(self, path):
-        if self.base_dir is not None and not os.path.isabs(path):
-            path = os.path.join(self.base_dir, path)
-        directory = os.path.dirname(path)
-        if directory not in self.known_directories:
-            mkdir_p(directory)
-            self.known_directories.add(directory)
-        f = open(path, 'w', encoding='utf-8')
-        try:
-            yield f
-        finally:
-            f.close()
-
-
-class SQLiteFile(object):
-    """Minimal file-like object that writes into SQLite DB"""
-    def __init__(self, key, db, commit_on_flush=False):
-        self.key = key
-        self.db = db
-        self.commit_on_flush = commit_on_flush
-        self.data = []
-
-    def write(self, data):
-        self.data.append(data)
-
-    def flush(self):
-        self.db[self.key] = ''.join(self.data)
-        if self.commit_on_flush:
-            self.db.commit()
-
-    def close(self):
-        self.flush()
-        self.db = None
-
-
-class SQLiteWriter(WriterBase):
-    def __init__(self, dbname, commit_interval=10000):
-        self.dbname = dbname
-        self.commit_interval = commit_interval
-        self.db = None
-        self._count = 0
-
-    def commit(self):
-        info('Committing {} ...'.format(self.dbname))
-        self.db.commit()
-        info('Committed {}'.format(self.dbname))
-
-    def __enter__(self):
-        try:
-            import sqlitedict
-        except ImportError:
-            error('failed to import sqlitedict; try `pip3 install sqlitedict`')
-            raise
-        self.db = sqlitedict.SqliteDict(self.dbname, autocommit=False)
-        return self
-
-    def __exit__(self, *args):
-        self.commit()
-
-    @contextmanager
-    def open(self, path):
-        # commit_on_flush=True makes this 2x slower
-        f = SQLiteFile(path, self.db, commit_on_flush=False)
-        try:
-            yield f
-        finally:
-            f.close()
-        self._count += 1
-        if self.commit_interval and self._count % self.commit_interval == 0:
-            self.commit()
-
-
-def write_text(writer, document, options=None):
-    if options is not None and options.no_text:
-        return
-    textout = output_filename(document, '.txt', options)
-    with writer.open(textout) as txt:
-        txt.write(document.text)
-        if not document.text.endswith('\n'):
-            txt.write('\n')
-
-
-def write_standoff(writer, document, options=None):
-    write_text(writer, document, options)
-    annout = output_filename(document, '.ann', options)
-    ann_by_id = {}
-    with writer.open(annout) as ann:
-        for pa_ann in document.annotations:
-            try:
-                for so_ann in pa_ann.to_ann_lines(ann_by_id):
-                    print(so_ann, file=ann)
-            except NotImplementedError as e:
-                warn('not converting {}'.format(type(pa_ann).__name__))
-            except Exception as e:
-                error('error converting {} in {}: {}({})'.format(
-                    type(pa_ann).__name__, document.id,
-                    type(e).__name__, str(e)))
-
-
-def write_json(writer, document, options=None):
-    write_text(writer, document, options)
-    outfn = output_filename(document, '.json', options)
-    with writer.open(outfn) as out:
-        out.write(document.to_json())
-
-
-def write_oa_jsonld(writer, document, options=None):
-    write_text(writer, document, options)
-    outfn = output_filename(document, '.jsonld', options)
-    with writer.open(outfn) as out:
-        out.write(document.to_oa_jsonld())
-
-
-def write_wa_jsonld(writer, document, options=None):
-    write_text(writer, document, options)
-    outfn = output_filename(document, '.jsonld', options)
-    with writer.open(outfn) as out:
-        out.write(document.to_wa_jsonld())
-
-
-def is_nominal_mention(a):
-    if not isinstance(a, SpanAnnotation):
-        return False
-    if a.type == 'Species':
-        return a.text.lower() in SPECIES_NOMINALS
-    else:
-        return False    # No nominals for the type
-
-
-def retype_nominal_mentions(document):
-    """Assign separate types to nominal mentions such as "patients"."""
-    for a in document.annotations:
-        if is_nominal_mention(a):
-            a.type = 'Nominal-{}'.format(a.type)
-
-
-def add_sentences(document, text=None, base_offset=0):
-    from ssplit import sentence_split
-
-    if text is None:
-        text = document.text
-        base_offset = 0
-
-    if text and not text.isspace():
-        split = sentence_split(text)
-        assert ''.join(split) == text
-        o = 0
-        for s in split:
-            t = s.rstrip()    # omit trailing whitespace
-            from_ = base_offset + o
-            to = base_offset + o + len(t)
-            span = SpanAnnotation(document.id, from_, to, t, 'sentence')
-            document.annotations.append(span)
-            o += len(s)
-
-    return document
-
-
-def segment(document):
-    title, tiab = document.title, document.text
-    if title and not title.isspace():
-        span = SpanAnnotation(document.id, 0, len(title), title, 'title')
-        document.annotations.append(span)
-    abstract = tiab[len(title)+1:]    # +1 for separating whitespace
-    assert title == tiab[:len(title)]
-    add_sentences(document, title, 0)
-    add_sentences(document, abstract, len(title)+1)
-    return document
-
-
-def convert_stream(fn, fl, writer, write_func, options=None):
-    if options.limit and convert.total_count >= options.limit:
-        return 0
-    i = 0
-    for i, document in enumerate(read_pubtator(fl, options.ids), start=1):
-        if i % 100 == 0:
-            info('Processed {} documents ...'.format(i))
-        if options.random is not None and random() > options.random:
-            continue    # skip
-        if options.segment:
-            segment(document)
-        if options.retype_nominal:
-            retype_nominal_mentions(document)
-
-        if not options.no_output:
-            write_func(writer, document, options)
-
-        convert.total_count += 1
-        if options.limit and convert.total_count >= options.limit:
-            break
-    info('Completed {}, processed {} documents.'.format(fn, i))
-    return i
-
-
-def convert(fn, writer, write_func, options=None):
-    if not fn.endswith('.gz'):
-        with open(fn, encoding=encoding(options)) as f:
-            return convert_stream(fn, f, writer, write_func, options)
-    else:
-        with gzip.open(fn, mode='rt', encoding=encoding(options)) as f:
-            return convert_stream(fn, f, writer, write_func, options)
-convert.total_count = 0
-
-
-def read_id_list(fn):
-    with open(fn) as f:
-        return [l.rstrip('\n') for l in f.readlines()]
-
-
 def main(argv):
     args = argparser().parse_args(argv[1:])
     if args.verbose:
         logger.setLevel(logging.INFO)
+    set_style(args.json_style)
     if args.ids:
-        args.ids = set(read_id_list(args.ids))
+        from idset import read_id_set
+        args.ids = read_id_set(args.ids, not args.no_id_cache)
     if args.random is not None and (args.random < 0 or args.random > 1):
         raise ValueError('must have 0 < ratio < 1')
+    # documents to read, skipping others before parsing
+    if args.random is not None:
+        from idset import IdSample
+        args.selected = IdSample(args.random, args.seed, args.ids)
+    else:
+        args.selected = args.ids
 
     if args.format == 'standoff':
         write_func = write_standoff
@@ -337,16 +154,96 @@ def main(argv):
         raise ValueError('unknown format {}'.format(args.format))
 
     name = args.output
-    if not args.database:
-        Writer = FilesystemWriter
-    else:
-        Writer = SQLiteWriter
+    if args.database:
         if not name.endswith('.sqlite'):
             name = name + '.sqlite'
-
-    with Writer(name) as writer:
+        writer = SQLiteWriter(name)
+    elif args.archive:
+        # unchanged documents are only in earlier shards with --hashes
+        writer = ShardWriter(name, args.shard_size, args.compress,
+                             append=args.hashes is not None)
+    else:
+        writer = FilesystemWriter(name, args.io_threads)
+
+    if args.punkt_snapshot:
+        from ssplit import set_snapshot
+        set_snapshot(args.punkt_snapshot)
+    if args.sentence_cache:
+        from sentencecache import SentenceCache
+        segment.cache = SentenceCache(args.sentence_cache,
+                                      args.sentence_cache_size)
+
+    metrics = convert.metrics
+    metrics.prometheus_file = args.prometheus
+    metrics.prometheus_interval = args.prometheus_interval
+    writer = MeteredWriter(writer, metrics)
+
+    state = None
+    if args.checkpoint:
+        convert.checkpoint = Checkpoint(args.checkpoint,
+                                        args.checkpoint_interval)
+        if args.resume:
+            state = convert.checkpoint.load()
+            if state is None:
+                warn('No checkpoint {}, starting from the beginning'.format(
+                    args.checkpoint))
+            else:
+                check_checkpoint_options(state, args)
+    elif args.resume:
+        raise ValueError('--resume requires --checkpoint')
+
+    if args.hashes:
+        stamp = state.get('hash_stamp') if state is not None else None
+        from hashstore import HashStore
+        # with --no-output, skip unchanged documents without recording
+        # the others, as their outputs are not written
+        convert.hashes = HashStore(args.hashes, stamp,
+                                   readonly=args.no_output)
+        if args.changes:
+            convert.changes = open(args.changes, 'a' if state else 'w')
+    elif args.changes:
+        raise ValueError('--changes requires --hashes')
+
+    with writer:
+        if state is not None:
+            restore_checkpoint(writer, state)
+            info('Resuming from {} at {} ({} documents converted)'.format(
+                state['file'], state['offset'], state['documents']))
         for fn in args.files:
-            convert(fn, writer, write_func, args)
+            if convert.checkpoint is None:
+                convert(fn, writer, write_func, args)
+                continue
+            if fn in convert.checkpoint.completed:
+                info('Skipping {}, converted before checkpoint'.format(fn))
+                continue
+            offset = 0
+            if state is not None and fn == state['file']:
+                offset = state['offset']
+            convert(fn, writer, write_func, args, offset)
+            convert.checkpoint.complete(fn)
+            convert.checkpoint.save(checkpoint_state(writer, None, 0, args))
+
+        if convert.hashes is not None and not convert.hashes.readonly:
+            writer.checkpoint()
+            flush_hashes()
+            remove_unconverted(args)
+
+    if convert.hashes is not None:
+        convert.hashes.close()
+    if convert.changes is not None:
+        convert.changes.close()
+
+    if segment.cache is not None:
+        info('Sentence cache: {} hits, {} misses'.format(
+            segment.cache.hits, segment.cache.misses))
+        segment.cache.close()
+
+    if args.metrics:
+        metrics.write_json(args.metrics)
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
+    info('Stage times: {}'.format(', '.join(
+        '{} {:.1f}s'.format(s, t) for s, t in metrics.times.items())))
 
     print('Done, converted {} ({} errors)'.format(
         convert.total_count, read_pubtator.errors, file=sys.stderr))